@@ -0,0 +1,101 @@
+## Checks that the output of convert_CE_data.py does not depend on
+## CHUNK_SIZE. A synthetic EXPD file with a few sparse missing values is
+## converted with several chunk sizes and the converted .csv files are
+## compared byte by byte.
+##
+## Usage:
+##
+##     python check_convert_CE_data.py
+
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import convert_CE_data
+
+## -------------------------------------------------------------------
+## Setup
+
+# The number of rows in the synthetic EXPD file.
+NUM_ROWS = 1000
+
+# The chunk sizes to compare. None reads the file in one go.
+CHUNK_SIZES = [None, 1, 7, 100, 999]
+
+## -------------------------------------------------------------------
+
+
+def make_expd(fname, random):
+
+    # The missing values are so sparse that most chunks do not contain any.
+
+    expd = pd.DataFrame({
+        "NEWID": (random.randint(1000000, 1000100, NUM_ROWS) * 10 + random.randint(1, 3, NUM_ROWS)).astype(str),
+        "ALLOC": random.randint(0, 10, NUM_ROWS).astype(float),
+        "COST": np.round(random.rand(NUM_ROWS) * 100.0, 2),
+        "GIFT": random.randint(1, 3, NUM_ROWS).astype(float),
+        "PUB_FLAG": random.randint(1, 3, NUM_ROWS).astype(float),
+        "UCC": random.choice(["010110", "200112", "560310", "600430"], NUM_ROWS),
+        "EXPNSQDY": random.randint(1, 8, NUM_ROWS).astype(float),
+        "EXPN_QDY": random.choice(["D", "T"], NUM_ROWS),
+        "EXPNWKDY": random.randint(1, 8, NUM_ROWS).astype(float),
+        "EXPN_KDY": random.choice(["D", "T"], NUM_ROWS),
+        "EXPNMO": random.randint(1, 13, NUM_ROWS).astype(float),
+        "EXPNMO_": random.choice(["D", "T"], NUM_ROWS),
+        "EXPNYR": np.full(NUM_ROWS, 2015.0),
+        "EXPNYR_": random.choice(["D", "T"], NUM_ROWS)
+    })
+
+    for name in ["ALLOC", "COST", "PUB_FLAG", "EXPNSQDY", "EXPNMO"]:
+        expd.loc[random.choice(NUM_ROWS, 3, replace=False), name] = np.nan
+
+    # Integers are written without a decimal point, like in the raw files.
+    expd.to_csv(fname, index=False, float_format="%.10g")
+
+
+def convert(raw_folder, chunk_size):
+
+    # Returns the content of the converted files.
+
+    output_folder = tempfile.mkdtemp(dir=raw_folder)
+
+    convert_CE_data.RAW_DATA_FOLDER = raw_folder
+    convert_CE_data.OUTPUT_FOLDER = output_folder
+    convert_CE_data.EXPD_FILES = ["expd151.csv"]
+    convert_CE_data.CHUNK_SIZE = chunk_size
+    convert_CE_data.NUM_WORKERS = 1
+    convert_CE_data.OUTPUT_FORMAT = "csv"
+    convert_CE_data.INCREMENTAL = False
+
+    convert_CE_data.main()
+
+    content = {}
+
+    for name in convert_CE_data.output_files():
+        with open(os.path.join(output_folder, name + ".csv"), "rb") as f:
+            content[name] = f.read()
+
+    return content
+
+
+def main():
+
+    with tempfile.TemporaryDirectory() as raw_folder:
+        make_expd(os.path.join(raw_folder, "expd151.csv"), np.random.RandomState(100))
+
+        expected = convert(raw_folder, CHUNK_SIZES[0])
+
+        for chunk_size in CHUNK_SIZES[1:]:
+            for name, content in convert(raw_folder, chunk_size).items():
+                if content != expected[name]:
+                    raise RuntimeError(
+                        name + ".csv differs between CHUNK_SIZE = " +
+                        str(CHUNK_SIZES[0]) + " and CHUNK_SIZE = " + str(chunk_size) + ".")
+
+    print("The output is the same for CHUNK_SIZE in " + str(CHUNK_SIZES) + ".")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
 ## This script imports the CE data and formats it in such a way the
 ## user can handle it way more easily in the getting started guide.
 
-import datetime
+import contextlib
+import hashlib
+import json
+import multiprocessing
 import os
+import shutil
+import tempfile
 
 import numpy as np
 import pandas as pd
@@ -13,74 +18,526 @@ import pandas as pd
 # The folder that contains all required .csv files.
 RAW_DATA_FOLDER = "./"
 
-## -------------------------------------------------------------------
-
-## Read the data from the source files
-expd = pd.read_csv(os.path.join(RAW_DATA_FOLDER, "expd151.csv"))
-expd = expd.append(pd.read_csv(os.path.join(RAW_DATA_FOLDER, "expd152.csv")))
-expd = expd.append(pd.read_csv(os.path.join(RAW_DATA_FOLDER, "expd153.csv")))
-expd = expd.append(pd.read_csv(os.path.join(RAW_DATA_FOLDER, "expd154.csv")))
+# The folder the converted .csv files will be written to.
+OUTPUT_FOLDER = "../"
 
-# -----------------------------------------------------------------------------
-# Set up target - we want to predict whether the item is a gift
+# The quarterly diary files containing the expenditures.
+EXPD_FILES = [
+    "expd151.csv",
+    "expd152.csv",
+    "expd153.csv",
+    "expd154.csv"
+]
 
-expd["TARGET"] = [0.0 if elem == 2 else 1.0 for elem in expd["GIFT"]]
+# The EXPD files are read and converted CHUNK_SIZE rows at a time, so
+# peak memory depends on the chunk size rather than on the number of
+# diaries. Set it to None to read every file in one go.
+CHUNK_SIZE = 100000
 
-# -----------------------------------------------------------------------------
-# Remove the instances where date is nan - they will be ignored by the Multirel
-# engine anyway, because of the NULL value handling policy.
+# The columns of the EXPD files that are read as strings and as integers.
+# All other columns are read as floats. The types are fixed, so the output
+# does not depend on whether a chunk happens to contain missing values, and
+# therefore not on CHUNK_SIZE.
+EXPD_STRING_COLUMNS = [
+    "NEWID",
+    "EXPN_QDY",
+    "EXPN_KDY",
+    "EXPNMO_",
+    "EXPNYR_"
+]
 
-expd = expd[
-    (expd["EXPNYR"] == expd["EXPNYR"]) & (expd["EXPNMO"] == expd["EXPNMO"])
+# The integer columns are read as nullable integers, so they are written
+# without a decimal point, even if they contain missing values. The UCCs are
+# integers as well - leading zeros are dropped, so "010110" becomes 10110
+# and UCC1 is "1".
+EXPD_INTEGER_COLUMNS = [
+    "ALLOC",
+    "GIFT",
+    "PUB_FLAG",
+    "UCC",
+    "EXPNSQDY",
+    "EXPNWKDY",
+    "EXPNMO",
+    "EXPNYR"
 ]
 
-# -----------------------------------------------------------------------------
-# Set up date - TIME_STAMP_SHIFTED exists to make sure only data up to the
-# PREVIOUS month is used.
+# The number of worker processes. Every quarter is converted by its own
+# worker and the results are merged in the order of EXPD_FILES, so the
+# output is the same as for NUM_WORKERS = 1.
+NUM_WORKERS = 1
 
-expd["TIME_STAMP"] = [
-    datetime.datetime(int(year), int(month), 1) for year, month in zip(expd["EXPNYR"], expd["EXPNMO"])
-]
+# The format of the converted files: "csv" or "parquet". Parquet keeps the
+# column types (native time stamps, dictionary encoded UCCs and BASKETID)
+# and requires pyarrow. Every .parquet table is a folder containing one
+# file per EXPD file.
+OUTPUT_FORMAT = "csv"
 
-expd["TIME_STAMP_SHIFTED"] = [
-    datetime.datetime(int(year), int(month), 15) for year, month in zip(expd["EXPNYR"], expd["EXPNMO"])
-]
+# The converted files and the Stage of the rows written to them. The
+# peripheral table contains all rows.
+OUTPUT_FILES = {
+    "CE_population_training": "Training",
+    "CE_population_validation": "Validation",
+    "CE_peripheral": None
+}
 
-# -----------------------------------------------------------------------------
-# Set up "BASKETID"
+# The population tables contain nothing but the Training and Validation
+# rows of the peripheral table. Set this to False to write the peripheral
+# table only - the getting started guide will then select the population
+# tables from it by their Stage.
+WRITE_POPULATION_FILES = True
 
-expd["BASKETID"] = [
-    str(x) + "_" + y.strftime("%Y-%m") for x, y in zip(expd["NEWID"], expd["TIME_STAMP"])
-]
+# When INCREMENTAL is set, the size, modification time and hash of every
+# converted EXPD file are recorded in MANIFEST_FILE. The next run then only
+# converts the files that were added to the end of EXPD_FILES and appends
+# them to the existing output. If any of the converted files has changed,
+# everything is converted again. The size of every .csv output is recorded
+# as well, and the outputs are truncated to it before appending, so rows
+# written by an interrupted run are not appended twice.
+INCREMENTAL = False
 
-# -----------------------------------------------------------------------------
-# Build a training, validation and testing flag. We will use January to August
-# for training, September and October for validation and November and December
-# for testing. If you decide to add more data, you should probably come up
-# with your own way of separating the data.
+MANIFEST_FILE = "CE_manifest.json"
 
-expd["Stage"] = [
-    "Testing" if month > 10.0 else
-    "Validation" if month > 8.0 else
-    "Training" for month in expd["EXPNMO"]
+# Columns that are stored dictionary encoded in the .parquet files.
+DICTIONARY_COLUMNS = [
+    "UCC",
+    "UCC1",
+    "UCC2",
+    "UCC3",
+    "UCC4",
+    "UCC5",
+    "BASKETID",
+    "Stage"
 ]
 
-# -----------------------------------------------------------------------------
-# Set up UCCs - the UCCs are a way to systematically categorize products.
-# Every digit has significance. That is why we create extra columns for
-# that contain the first digit, the first two digits etc.
+## -------------------------------------------------------------------
 
-ucc = np.asarray(expd["UCC"]).astype(str)
 
-expd["UCC1"] = [elem[:1] for elem in ucc]
-expd["UCC2"] = [elem[:2] for elem in ucc]
-expd["UCC3"] = [elem[:3] for elem in ucc]
-expd["UCC4"] = [elem[:4] for elem in ucc]
-expd["UCC5"] = [elem[:5] for elem in ucc]
+def convert_expd(expd):
+
+    # -------------------------------------------------------------------------
+    # Set up target - we want to predict whether the item is a gift
+
+    expd["TARGET"] = np.where((expd["GIFT"] == 2).fillna(False), 0.0, 1.0)
+
+    # -------------------------------------------------------------------------
+    # Remove the instances where date is nan - they will be ignored by the
+    # Multirel engine anyway, because of the NULL value handling policy.
+
+    expd = expd[expd["EXPNYR"].notna() & expd["EXPNMO"].notna()].copy()
+
+    # -------------------------------------------------------------------------
+    # Set up date - TIME_STAMP_SHIFTED exists to make sure only data up to the
+    # PREVIOUS month is used.
+    #
+    # Many rows share the same month, so every distinct (EXPNYR, EXPNMO) pair
+    # is only converted once and then broadcast to the rows by its code.
+
+    month_codes, months = pd.factorize(
+        expd["EXPNYR"].astype(int) * 100 + expd["EXPNMO"].astype(int)
+    )
+
+    time_stamps = pd.to_datetime(pd.DataFrame({
+        "year": months // 100,
+        "month": months % 100,
+        "day": 1
+    }))
+
+    expd["TIME_STAMP"] = time_stamps.values[month_codes]
+
+    expd["TIME_STAMP_SHIFTED"] = (time_stamps + pd.Timedelta(days=14)).values[month_codes]
+
+    # -------------------------------------------------------------------------
+    # Set up "BASKETID" - again, every distinct (NEWID, month) pair is only
+    # formatted once.
+
+    basket_codes, baskets = pd.MultiIndex.from_arrays(
+        [expd["NEWID"], month_codes]
+    ).factorize()
+
+    basket_ids = (
+        baskets.get_level_values(0).astype(str) + "_"
+        + time_stamps.dt.strftime("%Y-%m").values[baskets.get_level_values(1)]
+    )
+
+    expd["BASKETID"] = np.asarray(basket_ids)[basket_codes]
+
+    # -------------------------------------------------------------------------
+    # Build a training, validation and testing flag. We will use January to
+    # August for training, September and October for validation and November
+    # and December for testing. If you decide to add more data, you should
+    # probably come up with your own way of separating the data.
+
+    month = expd["EXPNMO"].to_numpy(float)
+
+    expd["Stage"] = np.select(
+        [month > 10.0, month > 8.0],
+        ["Testing", "Validation"],
+        default="Training"
+    )
+
+    # -------------------------------------------------------------------------
+    # Set up UCCs - the UCCs are a way to systematically categorize products.
+    # Every digit has significance. That is why we create extra columns for
+    # that contain the first digit, the first two digits etc.
+
+    ucc = expd["UCC"].astype(str)
+
+    for i in range(1, 6):
+        expd["UCC" + str(i)] = ucc.str[:i]
+
+    return expd
+
+
+def expd_dtypes(fname):
+
+    # The types of the columns of an EXPD file, based on its header alone.
+    # pandas would otherwise infer them for every chunk separately.
+
+    columns = pd.read_csv(fname, nrows=0).columns
+
+    return {
+        name: str if name in EXPD_STRING_COLUMNS else
+        "Int64" if name in EXPD_INTEGER_COLUMNS else float
+        for name in columns
+    }
+
+
+def read_expd(fname):
+
+    # Yields the converted content of a single EXPD file, CHUNK_SIZE rows at
+    # a time.
+
+    dtype = expd_dtypes(fname)
+
+    if CHUNK_SIZE is None:
+        yield convert_expd(pd.read_csv(fname, dtype=dtype))
+        return
+
+    for chunk in pd.read_csv(fname, dtype=dtype, chunksize=CHUNK_SIZE):
+        yield convert_expd(chunk)
+
+
+def to_arrow(expd):
+
+    # Join keys and UCCs are strings, all other numbers are stored as floats,
+    # just like the engine does. That way, the schema does not depend on
+    # whether a chunk happens to contain missing values.
+
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    expd = expd.copy()
+
+    for name in DICTIONARY_COLUMNS + ["NEWID"]:
+        expd[name] = expd[name].astype(str)
+
+    for name in expd.columns:
+        if pd.api.types.is_numeric_dtype(expd[name]):
+            expd[name] = expd[name].astype(float)
+
+    table = pa.Table.from_pandas(expd, preserve_index=False)
+
+    for name in DICTIONARY_COLUMNS:
+        i = table.schema.get_field_index(name)
+        table = table.set_column(i, name, pc.dictionary_encode(table[name]))
+
+    return table
+
+
+def file_info(fname, known=None):
+
+    # The hash is only computed if size or modification time have changed
+    # since the file was recorded in the manifest.
+
+    stat = os.stat(fname)
+
+    info = {
+        "name": os.path.basename(fname),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime
+    }
+
+    if known is not None and all(known[key] == info[key] for key in info):
+        info["sha256"] = known["sha256"]
+        return info
+
+    sha256 = hashlib.sha256()
+
+    with open(fname, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(block)
+
+    info["sha256"] = sha256.hexdigest()
+
+    return info
+
+
+def settings():
+
+    # The settings the converted output depends on. If they change, the
+    # output cannot be appended to.
+
+    return {
+        "OUTPUT_FORMAT": OUTPUT_FORMAT,
+        "WRITE_POPULATION_FILES": WRITE_POPULATION_FILES
+    }
+
+
+def load_manifest():
+
+    fname = os.path.join(OUTPUT_FOLDER, MANIFEST_FILE)
+
+    if not os.path.exists(fname):
+        return None
+
+    with open(fname) as f:
+        return json.load(f)
+
+
+def output_sizes():
+
+    # The sizes of the .csv outputs in bytes. The .parquet outputs consist of
+    # one file per EXPD file, which is overwritten when it is converted again,
+    # so there is nothing to record.
+
+    if OUTPUT_FORMAT != "csv":
+        return {}
+
+    return {
+        name: os.path.getsize(os.path.join(OUTPUT_FOLDER, name + ".csv"))
+        for name in output_files()
+    }
+
+
+def truncate_outputs(sizes):
+
+    # Removes whatever an interrupted run has appended to the .csv outputs
+    # since the manifest was saved.
+
+    for name, size in sizes.items():
+        with open(os.path.join(OUTPUT_FOLDER, name + ".csv"), "r+b") as f:
+            f.truncate(size)
+
+
+def save_manifest(files):
+
+    fname = os.path.join(OUTPUT_FOLDER, MANIFEST_FILE)
+
+    with open(fname + ".tmp", "w") as f:
+        json.dump({"settings": settings(), "files": files, "outputs": output_sizes()}, f, indent=2)
+
+    os.replace(fname + ".tmp", fname)
+
+
+def converted_files(fnames):
+
+    # Returns the number of EXPD files at the beginning of fnames that have
+    # already been converted and are unchanged since, along with their
+    # manifest entries and the sizes of the outputs at the time.
+
+    manifest = load_manifest()
+
+    if manifest is None or manifest["settings"] != settings():
+        return 0, [], {}
+
+    known = manifest["files"]
+    sizes = manifest.get("outputs", {})
+
+    if len(known) > len(fnames):
+        return 0, [], {}
+
+    for name in output_files():
+        path = os.path.join(OUTPUT_FOLDER, name + "." + OUTPUT_FORMAT)
+        if not os.path.exists(path):
+            return 0, [], {}
+        if OUTPUT_FORMAT == "csv" and (name not in sizes or os.path.getsize(path) < sizes[name]):
+            return 0, [], {}
+
+    files = []
+
+    for fname, info in zip(fnames, known):
+        if not os.path.exists(fname) or info["name"] != os.path.basename(fname):
+            return 0, [], {}
+        files.append(file_info(fname, info))
+        if files[-1]["sha256"] != info["sha256"]:
+            return 0, [], {}
+
+    return len(files), files, sizes
+
+
+class CsvWriter:
+
+    # Appends converted chunks to a .csv file. The header is only written
+    # once.
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.file = open(path, "a" if append else "w", newline="")
+        self.header = self.file.tell() == 0
+
+    def begin(self, part):
+        pass
+
+    def write(self, expd):
+        expd.to_csv(self.file, header=self.header)
+        self.header = False
+
+    def append(self, path):
+        with open(path, newline="") as part:
+            line = part.readline()
+            if self.header:
+                self.file.write(line)
+                self.header = not line
+            shutil.copyfileobj(part, self.file)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+
+    # Writes converted chunks to a folder of .parquet files, one file per
+    # EXPD file and one row group per chunk. The schema of a file is
+    # determined by its first chunk and all later chunks are cast to it.
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.writer = None
+        if not append:
+            shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+    def begin(self, part):
+        self.close()
+        self.part = os.path.join(self.path, part + ".parquet")
+
+    def write(self, expd):
+        import pyarrow.parquet as pq
+
+        table = to_arrow(expd)
+
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.part, table.schema)
+
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def output_files():
+
+    # The entries of OUTPUT_FILES that are actually written.
+
+    return {
+        name: stage for name, stage in OUTPUT_FILES.items()
+        if WRITE_POPULATION_FILES or stage is None
+    }
+
+
+def open_outputs(stack, folder, prefix="", append=False):
+
+    # Opens one writer per written output file.
+
+    writer = CsvWriter if OUTPUT_FORMAT == "csv" else ParquetWriter
+
+    return {
+        name: stack.enter_context(contextlib.closing(
+            writer(os.path.join(folder, prefix + name + "." + OUTPUT_FORMAT), append)
+        ))
+        for name in output_files()
+    }
+
+
+def remove_stale_populations():
+
+    # Population files left over from an earlier run would otherwise be
+    # preferred over the views on the peripheral table.
+
+    for name, stage in OUTPUT_FILES.items():
+        if stage is None:
+            continue
+        fname = os.path.join(OUTPUT_FOLDER, name)
+        if os.path.exists(fname + ".csv"):
+            os.remove(fname + ".csv")
+        shutil.rmtree(fname + ".parquet", ignore_errors=True)
+
+
+def write_expd(fname, part, outputs):
+
+    # Converts a single EXPD file and appends it to the output files.
+
+    for output in outputs.values():
+        output.begin(part)
+
+    for expd in read_expd(fname):
+        for name, stage in output_files().items():
+            outputs[name].write(expd if stage is None else expd[expd["Stage"] == stage])
+
+
+def convert_quarter(fname, part, folder):
+
+    # Runs in a worker process. The .parquet parts are written directly to
+    # the output folder, the .csv files are written to folder and returned,
+    # so they can be merged in the right order.
+
+    with contextlib.ExitStack() as stack:
+        if OUTPUT_FORMAT == "csv":
+            outputs = open_outputs(stack, folder, part + ".")
+        else:
+            outputs = open_outputs(stack, OUTPUT_FOLDER, append=True)
+        write_expd(fname, part, outputs)
+
+    return {name: output.path for name, output in outputs.items()}
+
+
+def main():
+
+    fnames = [os.path.join(RAW_DATA_FOLDER, fname) for fname in EXPD_FILES]
+
+    # The parts of the .parquet output are numbered, so that they are read
+    # in the order of EXPD_FILES.
+    parts = ["part-%04d-%s" % (i, os.path.splitext(fname)[0]) for i, fname in enumerate(EXPD_FILES)]
+
+    begin, files, sizes = converted_files(fnames) if INCREMENTAL else (0, [], {})
+
+    if begin == 0 and not WRITE_POPULATION_FILES:
+        remove_stale_populations()
+
+    if begin > 0:
+        truncate_outputs(sizes)
+
+    ## Export data into new files. The chunks are appended to the
+    ## output files as soon as they are converted.
+    with contextlib.ExitStack() as stack:
+        outputs = open_outputs(stack, OUTPUT_FOLDER, append=begin > 0)
+
+        if NUM_WORKERS == 1:
+            for fname, part in zip(fnames[begin:], parts[begin:]):
+                write_expd(fname, part, outputs)
+
+        else:
+            folder = stack.enter_context(tempfile.TemporaryDirectory(dir=OUTPUT_FOLDER))
+
+            with multiprocessing.Pool(NUM_WORKERS) as pool:
+                paths = pool.starmap(
+                    convert_quarter,
+                    [(fname, part, folder) for fname, part in zip(fnames[begin:], parts[begin:])]
+                )
+
+            # The .csv parts are merged in the order of EXPD_FILES.
+            if OUTPUT_FORMAT == "csv":
+                for part in paths:
+                    for name, output in outputs.items():
+                        output.append(part[name])
+
+    if INCREMENTAL:
+        save_manifest(files + [file_info(fname) for fname in fnames[begin:]])
+    elif os.path.exists(os.path.join(OUTPUT_FOLDER, MANIFEST_FILE)):
+        os.remove(os.path.join(OUTPUT_FOLDER, MANIFEST_FILE))
 
-## -------------------------------------------------------------------
 
-## Export data into new .csv files.
-expd[expd["Stage"] == "Training"].to_csv("../CE_population_training.csv")
-expd[expd["Stage"] == "Validation"].to_csv("../CE_population_validation.csv")
-expd.to_csv("../CE_peripheral.csv")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+## This script benchmarks the staging scripts example_01a - example_01e and
+## the staging pipeline in staging.py on synthetic data shaped like the CE
+## diaries. Every staging script is run in a separate process in which the
+## calls to getML and pandas are timed by phase. The results are appended
+## to a JSON lines file, one line per variant and run, so runs can be
+## compared over time.
+##
+## Usage:
+##
+##     python benchmark_staging.py --rows 1000000 --variants pandas sqlite
+##     python benchmark_staging.py --compare
+##
+## The getML engine needs to be running. The postgres and mysql variants
+## connect to the databases configured in their scripts and are recorded
+## as failed if those are not available.
+##
+## Memory is recorded for each process involved, as peak resident set
+## size in KB:
+##
+##     client_peak_rss_kb     the Python process running the staging script
+##     children_peak_rss_kb   the largest of its child processes, such as the
+##                            parallel_csv workers
+##     engine_peak_rss_kb     the getML engine, sampled every
+##                            ENGINE_SAMPLE_INTERVAL seconds (Linux only)
+##     engine_start_rss_kb    the getML engine before the script started, as
+##                            it keeps the data of earlier runs in memory
+
+import argparse
+import datetime
+import functools
+import json
+import os
+import re
+import resource
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+
+import generate_synthetic_data
+
+## -------------------------------------------------------------------
+## Setup
+
+# The folder this script is located in.
+FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+# The staging scripts that can be benchmarked.
+VARIANTS = {
+    "directly": "example_01a_stage_data_directly.py",
+    "pandas": "example_01b_stage_data_using_pandas.py",
+    "sqlite": "example_01c_stage_data_using_sqlite.py",
+    "postgres": "example_01d_stage_data_using_postgres.py",
+    "mysql": "example_01e_stage_data_using_mysql.py",
+    "pipeline": "staging.py"
+}
+
+# The file the results are appended to.
+RESULTS_FILE = os.path.join(FOLDER, "benchmark_staging.jsonl")
+
+# A regular expression matching the name of the getML engine's executable.
+# The engine is found by looking through the processes in /proc.
+ENGINE_PROCESS = r"^(getML|getml|engine)$"
+
+# The number of seconds between two samples of the engine's memory.
+ENGINE_SAMPLE_INTERVAL = 0.1
+
+## -------------------------------------------------------------------
+## Instrumentation
+
+
+def classify_execute(query):
+
+    # The staging scripts first CREATE the raw tables and then run the
+    # preprocessing through database.execute.
+
+    if re.search(r'CREATE TABLE\s+"?\w+_RAW"?\s*\(', query):
+        return "create"
+
+    return "preprocessing"
+
+
+def instrument(timings):
+
+    # Wraps the calls the staging scripts spend their time in, so that the
+    # time spent in each of them is added to the corresponding phase. Nested
+    # calls are only counted once.
+
+    import pandas as pd
+
+    import getml.data as data
+    import getml.database as database
+
+    import postgres_copy
+
+    depth = [0]
+
+    def timed(func, phase):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            name = phase(*args, **kwargs) if callable(phase) else phase
+            depth[0] += 1
+            begin = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                depth[0] -= 1
+                if depth[0] == 0:
+                    timings[name] = timings.get(name, 0.0) + time.perf_counter() - begin
+        return wrapper
+
+    database.sniff_csv = timed(database.sniff_csv, "sniff")
+    database.read_csv = timed(database.read_csv, "read_csv")
+    database.execute = timed(database.execute, lambda query, *args, **kwargs: classify_execute(query))
+
+    pd.read_csv = timed(pd.read_csv, "read_csv")
+
+    for name, phase in [
+            ("from_csv", "read_csv"),
+            ("from_db", "from_db"),
+            ("from_pandas", "from_pandas")]:
+        setattr(data.DataFrame, name, staticmethod(timed(getattr(data.DataFrame, name), phase)))
+
+    data.DataFrame.save = timed(data.DataFrame.save, "save")
+    data.DataFrame.to_db = timed(data.DataFrame.to_db, "to_db")
+
+    postgres_copy.copy_from = timed(postgres_copy.copy_from, "read_csv")
+    postgres_copy.from_db = timed(postgres_copy.from_db, "from_db")
+
+
+def run_variant(variant, output):
+
+    # Runs inside the child process.
+
+    timings = dict()
+
+    instrument(timings)
+
+    begin = time.perf_counter()
+
+    # staging.py parses its own arguments.
+    sys.argv = [os.path.join(FOLDER, VARIANTS[variant])]
+
+    runpy.run_path(sys.argv[0], run_name="__main__")
+
+    total = time.perf_counter() - begin
+
+    timings["other"] = total - sum(timings.values())
+
+    with open(output, "w") as f:
+        json.dump({
+            "phases": timings,
+            "total": total,
+            "client_peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "children_peak_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        }, f)
+
+
+def engine_pids():
+
+    # The processes in /proc whose executable matches ENGINE_PROCESS.
+
+    pids = []
+
+    if not os.path.isdir("/proc"):
+        return pids
+
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(os.path.join("/proc", pid, "cmdline"), "rb") as f:
+                executable = f.read().split(b"\0")[0].decode(errors="replace")
+        except OSError:
+            continue
+        if re.search(ENGINE_PROCESS, os.path.basename(executable)):
+            pids.append(pid)
+
+    return pids
+
+
+def rss_kb(pids):
+
+    # The sum of the resident set sizes of pids in KB, or None if none of
+    # them could be read.
+
+    total = None
+
+    for pid in pids:
+        try:
+            with open(os.path.join("/proc", pid, "status")) as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total = (total or 0) + int(line.split()[1])
+        except OSError:
+            continue
+
+    return total
+
+
+def run_sampled(command, env):
+
+    # Runs command and samples the memory of the engine while it runs.
+    # Returns the return code, the standard error and the engine's memory
+    # before and at its peak.
+
+    pids = engine_pids()
+
+    start = rss_kb(pids)
+
+    peak = start
+
+    with tempfile.TemporaryFile(mode="w+") as stderr:
+        process = subprocess.Popen(
+            command,
+            env=env,
+            cwd=FOLDER,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr,
+            universal_newlines=True
+        )
+
+        while process.poll() is None:
+            sample = rss_kb(pids)
+            if sample is not None:
+                peak = max(peak or 0, sample)
+            time.sleep(ENGINE_SAMPLE_INTERVAL)
+
+        stderr.seek(0)
+
+        return process.returncode, stderr.read(), start, peak
+
+
+## -------------------------------------------------------------------
+## Benchmark
+
+
+def benchmark(variants, rows, raw_folder, seed):
+
+    with tempfile.TemporaryDirectory() as tmp:
+
+        if raw_folder is None:
+            raw_folder = os.path.join(tmp, "raw")
+            os.makedirs(raw_folder)
+            generate_synthetic_data.generate(raw_folder, rows, seed)
+
+        for variant in variants:
+            output = os.path.join(tmp, variant + ".json")
+
+            env = dict(os.environ, CE_RAW_DATA_FOLDER=os.path.join(raw_folder, ""))
+
+            returncode, stderr, engine_start, engine_peak = run_sampled(
+                [sys.executable, __file__, "--run-variant", variant, "--output", output],
+                env
+            )
+
+            result = {
+                "time": datetime.datetime.now().isoformat(),
+                "variant": variant,
+                "rows": rows,
+                "raw_folder": raw_folder if rows is None else None,
+                "seed": seed,
+                "engine_start_rss_kb": engine_start,
+                "engine_peak_rss_kb": engine_peak
+            }
+
+            if returncode == 0:
+                with open(output) as f:
+                    result.update(json.load(f))
+                result["status"] = "ok"
+            else:
+                lines = stderr.strip().splitlines()
+                result["status"] = "failed"
+                result["error"] = lines[-1] if lines else ""
+
+            with open(RESULTS_FILE, "a") as f:
+                f.write(json.dumps(result) + "\n")
+
+            print(json.dumps(result))
+
+
+def compare():
+
+    # Prints the phases of the last two successful runs of every variant and
+    # input size.
+
+    runs = dict()
+
+    with open(RESULTS_FILE) as f:
+        for line in f:
+            result = json.loads(line)
+            if result["status"] == "ok":
+                runs.setdefault((result["variant"], result["rows"]), []).append(result)
+
+    for (variant, rows), results in sorted(runs.items(), key=str):
+        if len(results) < 2:
+            continue
+
+        previous, last = results[-2:]
+
+        print(variant + ", " + str(rows) + " rows: " + previous["time"] + " -> " + last["time"])
+
+        for phase in sorted(set(previous["phases"]) | set(last["phases"])) + ["total"]:
+            before = previous["total"] if phase == "total" else previous["phases"].get(phase, 0.0)
+            after = last["total"] if phase == "total" else last["phases"].get(phase, 0.0)
+            print("    %-14s %10.3fs %10.3fs %+8.1f%%" % (
+                phase, before, after, 100.0 * (after - before) / before if before else 0.0))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the CE staging scripts.")
+
+    parser.add_argument("--variants", nargs="+", choices=sorted(VARIANTS), default=["pandas", "sqlite"])
+    parser.add_argument("--rows", type=int, default=100000, help="Number of synthetic EXPD rows.")
+    parser.add_argument("--raw-folder", help="Use the CE files in this folder instead of synthetic data.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", action="store_true", help="Compare the last two runs.")
+    parser.add_argument("--run-variant", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.run_variant:
+        run_variant(args.run_variant, args.output)
+    elif args.compare:
+        compare()
+    else:
+        benchmark(args.variants, None if args.raw_folder else args.rows, args.raw_folder, args.seed)
@@ -1,3 +1,4 @@
+import calendar
 import datetime
 import os
 import time
@@ -6,11 +7,14 @@ import getml.data as data
 import getml.engine as engine 
 import getml.data.roles as roles 
 
+import population_split
+
 # -----------------------------------------------------------------------------
 # Set up folders - you need to insert folders on your computer
 
-# The folder that contains expd151.csv
-RAW_DATA_FOLDER = os.getenv("HOME") + "/Downloads/diary15/"
+# The folder that contains expd151.csv - can also be set using the
+# CE_RAW_DATA_FOLDER environment variable.
+RAW_DATA_FOLDER = os.getenv("CE_RAW_DATA_FOLDER", os.getenv("HOME") + "/Downloads/diary15/")
 
 # -----------------------------------------------------------------------------
 
@@ -171,7 +175,14 @@ df_memd.set_role(["AGE", "WAGEX"], roles.numerical)
 
 df_memd.set_role("NEWID", roles.join_key)
 
-time_stamp = df_memd.string_column("2015/01/01").as_ts(["%Y/%m/%d"])
+# All rows share the same time stamp - the same '2015/01/01' the SQL staging
+# scripts use. Parsing it once is a lot cheaper than letting as_ts parse the
+# same string for every row. Time stamps are stored as seconds since
+# 1970-01-01 (UTC).
+
+memd_time_stamp = calendar.timegm(time.strptime("2015/01/01", "%Y/%m/%d"))
+
+time_stamp = df_memd.numerical_column(memd_time_stamp)
 
 df_memd.add(time_stamp, "TIME_STAMP", roles.time_stamp)
 
@@ -180,19 +191,8 @@ df_memd.save()
 # #############################################################################
 # Staging POPULATION.
 
-# -----------------------------------------------------------------------------
-# Separate EXPD in training, testing, validation set
-
-random = df_expd.random()
-
-df_population_training = df_expd.where("POPULATION_TRAINING", random <= 0.7)
-
-df_population_validation = df_expd.where("POPULATION_VALIDATION", (random <= 0.85) & (random > 0.7))
-
-df_population_testing = df_expd.where("POPULATION_TESTING", random > 0.85)
-
 # -----------------------------------------------------------------------------------------------
-# NEWID in FMLD is unique - therefore, we can just LEFT JOIN it onto the POPULATION tables. 
+# NEWID in FMLD is unique - therefore, we can just LEFT JOIN it onto EXPD.
 
 income_ranks = [
     "INC_RANK",
@@ -211,51 +211,25 @@ for inc in income_ranks:
 
 df_fmld.set_role("NEWID", roles.join_key)
 
-df_population_training = df_population_training.join(
-        name="POPULATION_TRAINING", 
-        other=df_fmld, 
-        join_key="NEWID",
-        other_cols=[
-            df_fmld["INC_RANK"],
-            df_fmld["INC_RNK1"],
-            df_fmld["INC_RNK2"],
-            df_fmld["INC_RNK3"],
-            df_fmld["INC_RNK4"],
-            df_fmld["INC_RNK5"],
-            df_fmld["INC_RNKM"]
-        ]
-)
+# -----------------------------------------------------------------------------
+# Separate EXPD in training, testing, validation set - every consumer unit
+# ends up in exactly one of them. The partitions are assigned in FMLD, which
+# has one row per NEWID, and joined onto EXPD along with the income ranks,
+# see population_split.py.
 
-df_population_validation = df_population_validation.join(
-        name="POPULATION_VALIDATION", 
-        other=df_fmld, 
-        join_key="NEWID",
-        other_cols=[
-            df_fmld["INC_RANK"],
-            df_fmld["INC_RNK1"],
-            df_fmld["INC_RNK2"],
-            df_fmld["INC_RNK3"],
-            df_fmld["INC_RNK4"],
-            df_fmld["INC_RNK5"],
-            df_fmld["INC_RNKM"]
-        ]
-)
+population_split.add_partitions(df_fmld)
 
-df_population_testing = df_population_testing.join(
-        name="POPULATION_TESTING", 
-        other=df_fmld, 
+df_population_all = df_expd.join(
+        name="POPULATION_ALL",
+        other=df_fmld,
         join_key="NEWID",
-        other_cols=[
-            df_fmld["INC_RANK"],
-            df_fmld["INC_RNK1"],
-            df_fmld["INC_RNK2"],
-            df_fmld["INC_RNK3"],
-            df_fmld["INC_RNK4"],
-            df_fmld["INC_RNK5"],
-            df_fmld["INC_RNKM"]
-        ]
+        other_cols=[df_fmld[inc] for inc in income_ranks + [population_split.PARTITION]],
+        how="left"
 )
 
+df_population_training, df_population_validation, df_population_testing = population_split.split(
+    df_population_all)
+
 # -----------------------------------------------------------------------------------------------
 
 df_population_training.save()
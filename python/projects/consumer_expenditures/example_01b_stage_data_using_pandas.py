@@ -8,11 +8,14 @@ import pandas as pd
 import getml.data as data
 import getml.engine as engine
 
+import population_split
+
 # -----------------------------------------------------------------------------
 # Set up folders - you need to insert folders on your computer
 
-# The folder that contains expd151.csv
-RAW_DATA_FOLDER = os.getenv("HOME") + "/Downloads/diary15"
+# The folder that contains expd151.csv - can also be set using the
+# CE_RAW_DATA_FOLDER environment variable.
+RAW_DATA_FOLDER = os.getenv("CE_RAW_DATA_FOLDER", os.getenv("HOME") + "/Downloads/diary15")
 
 # -----------------------------------------------------------------------------
 
@@ -94,7 +97,11 @@ expd["UCC5"] = [elem[:5] for elem in ucc]
 memd["TIME_STAMP"] = [pd.Timestamp("2015-01-01") for i in range(memd.shape[0])]
 
 # -----------------------------------------------------------------------------
-# Make the population table
+# Make the population table. The partitions are assigned in FMLD, which has
+# one row per NEWID, and merged into the population table along with the
+# income ranks, see population_split.py.
+
+fmld[population_split.PARTITION] = population_split.partition_index(fmld["NEWID"])
 
 FMLD_COLS = [
     "INC_RANK",
@@ -104,6 +111,7 @@ FMLD_COLS = [
     "INC_RNK4",
     "INC_RNK5",
     "INC_RNKM",
+    population_split.PARTITION,
     "NEWID"
 ]
 
@@ -184,7 +192,8 @@ population_roles = {
     "time_stamp": EXPD_TIME_STAMPS,
     "categorical": EXPD_CATEGORICAL,
     "numerical": EXPD_NUMERICAL + FMLD_NUMERICAL,
-    "target": EXPD_TARGETS
+    "target": EXPD_TARGETS,
+    "unused_float": [population_split.PARTITION]
 }
 
 df_population_all = data.DataFrame.from_pandas(
@@ -204,20 +213,16 @@ df_population_all.set_unit("EXPNMO", "month")
 df_population_all.save()
 
 # -----------------------------------------------------------------------------
-# Separate POPULATION_ALL into training, testing, validation set.
+# Separate POPULATION_ALL into training, testing, validation set - every
+# consumer unit ends up in exactly one of them, see population_split.py.
 
-random = df_population_all.random()
-
-df_population_training = df_population_all.where("POPULATION_TRAINING", random <= 0.7)
+df_population_training, df_population_validation, df_population_testing = population_split.split(
+    df_population_all)
 
 df_population_training.save()
 
-df_population_validation = df_population_all.where("POPULATION_VALIDATION", (random <= 0.85) & (random > 0.7))
-
 df_population_validation.save()
 
-df_population_testing = df_population_all.where("POPULATION_TESTING", random > 0.85)
-
 df_population_testing.save()
 
 # -----------------------------------------------------------------------------
@@ -0,0 +1,225 @@
+## This script generates synthetic data shaped like the CE diaries
+## (diary15.zip), so the staging and feature building scripts can be run
+## without the original download and at any scale.
+##
+## It writes expd151.csv - expd154.csv, fmld151.csv - fmld154.csv and
+## memd151.csv - memd154.csv with the columns declared in the CREATE TABLE
+## statements of raw_schemas.sql. Runs with the same seed produce the same
+## files.
+##
+## Usage:
+##
+##     python generate_synthetic_data.py --rows 10000000 --folder ~/synthetic_diary15
+
+import argparse
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+## -------------------------------------------------------------------
+## Setup
+
+# The folder this script is located in.
+FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+# The file the table schemas are taken from.
+SCHEMA_FILE = os.path.join(FOLDER, "raw_schemas.sql")
+
+# In the original data, every consumer unit keeps a diary for two weeks
+# and every diary week has its own NEWID. A diary week contains about 40
+# expenditures and a consumer unit has about 2.5 members.
+EXPENDITURES_PER_NEWID = 40.0
+MEMBERS_PER_NEWID = 2.5
+
+# The number of distinct UCCs and the exponent of their Zipf distribution.
+NUM_UCCS = 600
+UCC_EXPONENT = 1.1
+
+# The share of gifts and the share of expenditures without a date.
+GIFT_SHARE = 0.05
+MISSING_DATE_SHARE = 0.01
+
+# Households are generated and written in chunks of this size, so memory
+# usage does not depend on the number of rows.
+CHUNK_SIZE = 10000
+
+## -------------------------------------------------------------------
+
+
+def read_schemas():
+
+    # Returns the column names and types of EXPD, FMLD and MEMD as declared
+    # in the CREATE TABLE statements of SCHEMA_FILE.
+
+    with open(SCHEMA_FILE) as f:
+        script = f.read()
+
+    schemas = dict()
+
+    for table, columns in re.findall(r"CREATE TABLE (\w+)_RAW\((.*?)\);", script, re.DOTALL):
+        schemas[table] = [tuple(line.split()[:2]) for line in columns.split(",")]
+
+    return schemas
+
+
+def make_uccs(rng):
+
+    # UCCs are six digit codes, the leading digits are the product category.
+    # Their frequencies follow a Zipf distribution and every UCC has its own
+    # probability of being bought as a gift.
+
+    categories = rng.choice(np.arange(1, 10), NUM_UCCS) * 100000
+
+    uccs = np.unique(categories + rng.integers(0, 100000, NUM_UCCS))
+
+    weights = 1.0 / np.arange(1, len(uccs) + 1) ** UCC_EXPONENT
+
+    probabilities = rng.permutation(weights / weights.sum())
+
+    gift_shares = np.clip(rng.lognormal(np.log(GIFT_SHARE), 1.0, len(uccs)), 0.0, 1.0)
+
+    return uccs, probabilities, gift_shares
+
+
+def fill(rng, columns, n, given):
+
+    # Returns a data frame with n rows containing the columns in order.
+    # Columns not in given are filled with random values of their type.
+
+    data = dict()
+
+    for name, dtype in columns:
+        if name in given:
+            data[name] = given[name]
+        elif dtype == "INTEGER":
+            data[name] = rng.integers(0, 10, n)
+        elif dtype == "REAL":
+            data[name] = np.round(rng.random(n) * 100.0, 2)
+        else:
+            data[name] = rng.integers(0, 10, n).astype(str)
+
+    return pd.DataFrame(data)
+
+
+def generate_households(rng, schemas, uccs, quarter, year, newids):
+
+    # Generates EXPD, FMLD and MEMD for the diary weeks in newids.
+
+    n = len(newids)
+
+    ucc, ucc_probabilities, gift_shares = uccs
+
+    # ---------------------------------------------------------------------
+    # EXPD - the number of expenditures per NEWID is skewed.
+
+    counts = rng.negative_binomial(2, 2.0 / (2.0 + EXPENDITURES_PER_NEWID), n)
+
+    expd_newids = np.repeat(newids, counts)
+
+    m = len(expd_newids)
+
+    items = rng.choice(len(ucc), m, p=ucc_probabilities)
+
+    months = rng.integers(quarter * 3 - 2, quarter * 3 + 1, n)
+
+    expnmo = np.repeat(months, counts).astype(str)
+    expnyr = np.full(m, str(year), dtype=object)
+
+    missing = rng.random(m) < MISSING_DATE_SHARE
+    expnmo[missing] = ""
+    expnyr[missing] = ""
+
+    expd = fill(rng, schemas["EXPD"], m, {
+        "NEWID": expd_newids.astype(str),
+        "UCC": ucc[items].astype(str),
+        "COST": np.round(rng.lognormal(2.0, 1.2, m), 2),
+        "GIFT": np.where(rng.random(m) < gift_shares[items], 1, 2),
+        "EXPNMO": expnmo,
+        "EXPNYR": expnyr
+    })
+
+    # ---------------------------------------------------------------------
+    # FMLD - one row per NEWID.
+
+    fmld = fill(rng, schemas["FMLD"], n, dict(
+        [("NEWID", newids.astype(str))] +
+        [(name, np.round(rng.random(n), 7)) for name in [
+            "INC_RANK",
+            "INC_RNK1",
+            "INC_RNK2",
+            "INC_RNK3",
+            "INC_RNK4",
+            "INC_RNK5",
+            "INC_RNKM"]]
+    ))
+
+    # ---------------------------------------------------------------------
+    # MEMD - at least one member per NEWID.
+
+    members = 1 + rng.poisson(MEMBERS_PER_NEWID - 1.0, n)
+
+    k = members.sum()
+
+    memd = fill(rng, schemas["MEMD"], k, {
+        "NEWID": np.repeat(newids, members).astype(str),
+        "AGE": rng.integers(0, 90, k),
+        "WAGEX": np.round(rng.lognormal(10.0, 1.0, k)),
+        "SEX": rng.integers(1, 3, k).astype(str)
+    })
+
+    return {"EXPD": expd, "FMLD": fmld, "MEMD": memd}
+
+
+def generate(folder, rows, seed=0, year=2015):
+
+    # Writes the twelve quarterly files to folder. The EXPD files contain
+    # about rows rows in total.
+
+    rng = np.random.default_rng(seed)
+
+    schemas = read_schemas()
+
+    uccs = make_uccs(rng)
+
+    newids_per_quarter = max(int(rows / EXPENDITURES_PER_NEWID / 4), 1)
+
+    # Consumer units are numbered consecutively, the last digit of the NEWID
+    # is the diary week.
+    first = 1000000
+
+    for quarter in range(1, 5):
+
+        fnames = {
+            table: os.path.join(folder, table.lower() + str(year)[-2:] + str(quarter) + ".csv")
+            for table in schemas
+        }
+
+        units = first + np.arange(newids_per_quarter // 2 + newids_per_quarter % 2)
+
+        newids = np.stack([units * 10 + 1, units * 10 + 2], axis=1).ravel()[:newids_per_quarter]
+
+        first += len(units)
+
+        for begin in range(0, len(newids), CHUNK_SIZE):
+            tables = generate_households(
+                rng, schemas, uccs, quarter, year, newids[begin:begin + CHUNK_SIZE])
+
+            for table, df in tables.items():
+                df.to_csv(fnames[table], mode="w" if begin == 0 else "a", header=begin == 0, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic CE diary data.")
+
+    parser.add_argument("--folder", default=".", help="The folder to write the files to.")
+    parser.add_argument("--rows", type=int, default=500000, help="Number of EXPD rows.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--year", type=int, default=2015)
+
+    args = parser.parse_args()
+
+    os.makedirs(args.folder, exist_ok=True)
+
+    generate(args.folder, args.rows, args.seed, args.year)
@@ -0,0 +1,90 @@
+## Parses CSV files in a pool of worker processes and hands the rows to a
+## single writer in the order in which they appear in the files, so the
+## result does not depend on the number of workers. Used by staging.py.
+##
+## The files are split into byte ranges that begin and end at line breaks,
+## so even a single large file keeps all workers busy. This assumes that
+## quoted fields do not contain line breaks, which is true for the CE files.
+
+import io
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+
+## -------------------------------------------------------------------
+## Setup
+
+# The number of bytes parsed by a worker at a time.
+CHUNK_SIZE = 64 * 1024 * 1024
+
+## -------------------------------------------------------------------
+
+
+def split(fname, chunk_size):
+
+    # Returns the byte ranges of fname without the header.
+
+    size = os.path.getsize(fname)
+
+    ranges = []
+
+    with open(fname, "rb") as f:
+        f.readline()
+
+        begin = f.tell()
+
+        while begin < size:
+            f.seek(min(begin + chunk_size, size))
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((begin, end))
+            begin = end
+
+    return ranges
+
+
+def parse(task):
+
+    # Returns the rows in a byte range as tuples. Empty fields in columns
+    # that are not TEXT become None, so they are stored as NULL.
+
+    fname, begin, end, columns = task
+
+    with open(fname, "rb") as f:
+        f.seek(begin)
+        buf = f.read(end - begin)
+
+    df = pd.read_csv(
+        io.BytesIO(buf),
+        header=None,
+        names=[column for column, _ in columns],
+        dtype=str,
+        keep_default_na=False
+    ).astype(object)
+
+    for column, dtype in columns:
+        if dtype != "TEXT":
+            df[column] = np.where(df[column] == "", None, df[column])
+
+    return list(df.itertuples(index=False, name=None))
+
+
+def read_csv(fnames, columns, write, num_workers, chunk_size=CHUNK_SIZE):
+
+    # Calls write with the rows of fnames, one chunk at a time. columns are
+    # the names and types of the columns, as returned by
+    # schema_cache.create_table.
+
+    tasks = [
+        (fname, begin, end, columns)
+        for fname in fnames
+        for begin, end in split(fname, chunk_size)
+    ]
+
+    with multiprocessing.Pool(num_workers) as pool:
+        # imap returns the chunks in the order of the tasks, no matter which
+        # worker finishes first.
+        for rows in pool.imap(parse, tasks):
+            write(rows)
@@ -0,0 +1,119 @@
+## Splits a population table into training, validation and testing set
+## by hashing a key column. The partition of a row only depends on its key,
+## so rows with the same key always end up in the same partition, no matter
+## the order of the rows, the staging script or the run.
+##
+## By default, the key is the consumer unit: the last digit of NEWID is the
+## diary week, the digits before identify the consumer unit. Splitting by
+## NEWID alone would put the two diary weeks of a household into different
+## sets.
+##
+## The keys are hashed where there is one row per NEWID - in FMLD - rather
+## than in the population table, so only FMLD's NEWIDs are read into Python
+## and only one PARTITION value per NEWID is sent back to the engine:
+##
+##     population_split.add_partitions(df_fmld)
+##
+##     df_population_all = df_expd.join(
+##         ..., other=df_fmld, join_key="NEWID",
+##         other_cols=[..., df_fmld["PARTITION"]], how="left")
+##
+##     df_training, df_validation, df_testing = population_split.split(df_population_all)
+##
+## Rows of which the NEWID is not in FMLD have no partition and are not
+## contained in any of the sets.
+
+import numpy as np
+import pandas as pd
+
+## -------------------------------------------------------------------
+## Setup
+
+# The names of the partitions and their shares of the keys.
+PARTITIONS = [
+    ("POPULATION_TRAINING", 0.7),
+    ("POPULATION_VALIDATION", 0.15),
+    ("POPULATION_TESTING", 0.15)
+]
+
+# The number of buckets the hashes are mapped to before they are assigned
+# to the partitions.
+NUM_BUCKETS = 1000000
+
+# The name of the column containing the index of the partition.
+PARTITION = "PARTITION"
+
+## -------------------------------------------------------------------
+
+
+def households(newids):
+
+    # A NEWID that has been formatted as a float ("10000011.0") would
+    # silently be split into per-NEWID keys, so we insist on plain digits.
+
+    newids = pd.Series(newids, dtype=str)
+
+    invalid = ~newids.str.match(r"^[0-9]{2,}$")
+
+    if invalid.any():
+        raise ValueError(
+            "NEWID must consist of digits only, got '" + newids[invalid].iloc[0] + "'.")
+
+    return newids.str[:-1].values
+
+
+def assign(keys, shares, seed=0):
+
+    # Returns the index of the partition of every key. pandas' hash_array is
+    # the same on every platform and in every process for a given hash_key.
+
+    hashes = pd.util.hash_array(np.asarray(keys, dtype=object), hash_key="%016d" % seed)
+
+    position = (hashes % NUM_BUCKETS).astype(float) / NUM_BUCKETS
+
+    bounds = np.cumsum(shares)[:-1] / np.sum(shares)
+
+    return np.searchsorted(bounds, position, side="right")
+
+
+def partition_index(values, partitions=PARTITIONS, key=households, seed=0):
+
+    # Returns the index of the partition of every value as a float array.
+    # Every distinct value is only hashed once.
+
+    unique, inverse = np.unique(np.asarray(values), return_inverse=True)
+
+    index = assign(key(unique), [share for _, share in partitions], seed)
+
+    return index[inverse].astype(float)
+
+
+def add_partitions(df_keys, column="NEWID", partitions=PARTITIONS, key=households, seed=0):
+
+    # Adds the PARTITION column to the engine data frame df_keys, which must
+    # contain every value of column exactly once, like FMLD. Join it onto
+    # the table you want to split.
+
+    values = df_keys[column].to_numpy()
+
+    if len(np.unique(values)) != len(values):
+        raise ValueError("'" + column + "' must be unique in '" + df_keys.name + "'.")
+
+    index = assign(key(values), [share for _, share in partitions], seed)
+
+    df_keys.add(index.astype(float), PARTITION)
+
+
+def split(df, partitions=PARTITIONS):
+
+    # Returns the partitions of the engine data frame df, in the order of
+    # partitions. df must contain the PARTITION column, see add_partitions.
+
+    partition = df[PARTITION]
+
+    df_partitions = [df.where(name, partition == float(i)) for i, (name, _) in enumerate(partitions)]
+
+    for df_partition in df_partitions:
+        df_partition.rm(PARTITION)
+
+    return df_partitions
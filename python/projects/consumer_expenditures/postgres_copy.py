@@ -0,0 +1,90 @@
+## Moves data in and out of PostgreSQL using COPY over a single psycopg2
+## connection, rather than row by row. Used by
+## example_01d_stage_data_using_postgres.py and staging.py if COPY_LOAD is
+## set.
+##
+## psycopg2 is only needed for this. To try it against a throwaway
+## database that matches the settings in the example scripts:
+##
+##     docker run --rm -p 5432:5432 -e POSTGRES_DB=mydb \
+##         -e POSTGRES_USER=myuser -e POSTGRES_PASSWORD=mypassword postgres
+
+import os
+import shutil
+import tempfile
+
+import getml.data as data
+
+
+def connect(**settings):
+
+    # settings are the keyword arguments of database.connect_postgres,
+    # without time_formats.
+
+    import psycopg2
+
+    return psycopg2.connect(**settings)
+
+
+def copy_from(connection, table, fnames):
+
+    # Streams the CSV files into table, which must already exist. The table
+    # is truncated in the same transaction, which allows FREEZE - the rows
+    # are written as already frozen and do not have to be rewritten by the
+    # next VACUUM. Empty fields become NULL, like with database.read_csv.
+
+    query = 'COPY "' + table + '" FROM STDIN WITH (FORMAT csv, HEADER true, FREEZE true)'
+
+    with connection:
+        with connection.cursor() as cursor:
+            cursor.execute('TRUNCATE "' + table + '";')
+            for fname in fnames:
+                with open(fname) as f:
+                    cursor.copy_expert(query, f)
+
+
+def copy_to(connection, table, columns, fname, time_stamps=()):
+
+    # Writes columns of table to fname. The time stamps are written as
+    # dates in ISO format, which is what DataFrame.from_csv expects.
+
+    select = ", ".join(
+        'to_date("' + column + '", \'YYYY/MM/DD\') AS "' + column + '"'
+        if column in time_stamps else '"' + column + '"'
+        for column in columns
+    )
+
+    query = 'COPY (SELECT ' + select + ' FROM "' + table + '") TO STDOUT WITH (FORMAT csv, HEADER true)'
+
+    with connection:
+        with connection.cursor() as cursor:
+            with open(fname, "w") as f:
+                cursor.copy_expert(query, f)
+
+
+def from_db(connection, table_name, name, roles):
+
+    # Does what data.DataFrame.from_db(..., ignore=True) does, but the table
+    # is extracted with COPY and parsed by the engine's CSV reader. The CSV
+    # file is written to a temporary folder on this machine, so the engine
+    # has to be able to read it - it must run on the same machine or share
+    # its file system.
+
+    columns = [column for role in roles.values() for column in role]
+
+    folder = tempfile.mkdtemp()
+
+    try:
+        fname = os.path.join(folder, table_name + ".csv")
+
+        copy_to(connection, table_name, columns, fname, roles.get("time_stamp", []))
+
+        return data.DataFrame.from_csv(
+            fnames=[fname],
+            name=name,
+            roles=roles,
+            ignore=True
+        )
+
+    finally:
+        shutil.rmtree(folder)
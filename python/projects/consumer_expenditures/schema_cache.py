@@ -0,0 +1,136 @@
+## Caches the results of database.sniff_csv, so that the staging scripts
+## only need to sniff the raw CE files once.
+##
+## The cache maps a fingerprint of the files - their header and the first
+## SAMPLE_SIZE bytes - to the column names and types suggested by the
+## sniffer. The CREATE TABLE statements are generated from the cache, with
+## the types of single columns overridden where the sniffer's guess is not
+## what we want (such as NEWID, which looks like a number but is a key).
+
+import hashlib
+import json
+import os
+import re
+
+import getml.database as database
+
+## -------------------------------------------------------------------
+## Setup
+
+# The file the sniffed schemas are stored in.
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema_cache.json")
+
+# The number of bytes at the beginning of every file that go into the
+# fingerprint.
+SAMPLE_SIZE = 65536
+
+# How table and column names are quoted in the generated DDL.
+QUOTES = {
+    "sqlite": "",
+    "postgres": '"',
+    "mysql": ""
+}
+
+## -------------------------------------------------------------------
+
+
+def fingerprint(name, fnames, dialect):
+
+    # The sniffer's suggestions depend on the database we are connected to,
+    # so the dialect is part of the fingerprint.
+
+    sha256 = hashlib.sha256((dialect + "/" + name).encode())
+
+    for fname in fnames:
+        with open(fname, "rb") as f:
+            sha256.update(f.read(SAMPLE_SIZE))
+
+    return sha256.hexdigest()
+
+
+def parse(query):
+
+    # Extracts the column names and types from the CREATE TABLE statement
+    # returned by database.sniff_csv.
+
+    body = re.search(r"CREATE TABLE[^(]*\((.*)\)\s*;", query, re.DOTALL).group(1)
+
+    columns = []
+
+    for line in body.split(","):
+        column, dtype = line.strip().split(None, 1)
+        columns.append([column.strip('"`'), dtype.strip()])
+
+    return columns
+
+
+def load():
+
+    if not os.path.exists(CACHE_FILE):
+        return dict()
+
+    with open(CACHE_FILE) as f:
+        return json.load(f)
+
+
+def save(cache):
+
+    with open(CACHE_FILE + ".tmp", "w") as f:
+        json.dump(cache, f, indent=2)
+
+    os.replace(CACHE_FILE + ".tmp", CACHE_FILE)
+
+
+def sniff(name, fnames, dialect):
+
+    # Returns the column names and types of the files, only calling
+    # database.sniff_csv if they are not in the cache yet.
+
+    cache = load()
+
+    key = fingerprint(name, fnames, dialect)
+
+    if key not in cache:
+        cache[key] = parse(database.sniff_csv(name, fnames))
+        save(cache)
+
+    return cache[key]
+
+
+def ddl(name, columns, dialect):
+
+    # Generates DROP TABLE and CREATE TABLE statements in the layout of the
+    # sniffer's suggestions.
+
+    quote = QUOTES[dialect]
+
+    width = max(len(column) for column, _ in columns) + 2 * len(quote)
+
+    lines = [
+        "    " + (quote + column + quote).ljust(width) + " " + dtype
+        for column, dtype in columns
+    ]
+
+    table = quote + name + quote
+
+    return (
+        "DROP TABLE IF EXISTS " + table + ";\n\n" +
+        "CREATE TABLE " + table + "(\n" + ",\n".join(lines) + ");\n"
+    )
+
+
+def create_table(name, fnames, dialect, overrides=None):
+
+    # Creates the table name for loading fnames and returns its columns.
+    # overrides maps column names to the types they should have instead of
+    # the sniffed ones.
+
+    overrides = overrides or dict()
+
+    columns = [
+        [column, overrides.get(column, dtype)] for column, dtype in sniff(name, fnames, dialect)
+    ]
+
+    database.execute(ddl(name, columns, dialect))
+
+    return columns
@@ -0,0 +1,720 @@
+## The staging of the CE data as a single pipeline, used by example_01c -
+## example_01e. The preprocessing of EXPD, FMLD and MEMD is described once,
+## the dialect
+## adapters below turn it into SQL for SQLite, PostgreSQL and MySQL and
+## provide the fastest way of loading the raw files into each of them.
+##
+## Usage:
+##
+##     python staging.py --dialect sqlite
+##     python staging.py --dialect postgres --raw-folder ~/Downloads/diary15/
+##     python staging.py --in-engine
+##
+## The default connection settings of the dialects are those of the example
+## scripts - you need to adapt them to your databases, either here or in
+## example_01c - example_01e.
+
+import argparse
+import calendar
+import os
+import re
+import sqlite3
+import time
+
+import getml.data as data
+import getml.data.roles as roles
+import getml.database as database
+import getml.engine as engine
+
+import parallel_csv
+import population_split
+import postgres_copy
+import schema_cache
+
+## -------------------------------------------------------------------
+## Setup
+
+# The folder that contains expd151.csv - can also be set using the
+# CE_RAW_DATA_FOLDER environment variable.
+RAW_DATA_FOLDER = os.getenv("CE_RAW_DATA_FOLDER", os.getenv("HOME") + "/Downloads/diary15/")
+
+# If PROJECTED_LOAD is set, only the columns of FMLD and MEMD we actually use
+# are loaded into FMLD_RAW and MEMD_RAW rather than all of the several
+# hundred columns. The CSVs are parsed by the engine, which drops the other
+# columns.
+PROJECTED_LOAD = True
+
+# The number of processes parsing the raw files when loading them into
+# SQLite. With 1, they are loaded by the engine, see parallel_csv.py.
+NUM_WORKERS = 1
+
+# The types that should differ from the sniffer's suggestions, see
+# schema_cache.py.
+EXPD_TYPES = {
+    "NEWID": "TEXT",
+    "UCC": "TEXT",
+    "EXPNMO": "TEXT",
+    "EXPNYR": "TEXT"
+}
+
+FMLD_TYPES = {
+    "NEWID": "TEXT"
+}
+
+MEMD_TYPES = {
+    "NEWID": "TEXT"
+}
+
+# The date of all rows in MEMD, formatted as %Y/%m/%d.
+MEMD_DATE = "2015/01/01"
+
+## -------------------------------------------------------------------
+## Columns
+
+FMLD_JOIN_KEYS = [
+    "NEWID"
+]
+
+FMLD_NUMERICAL = [
+    "INC_RANK",
+    "INC_RNK1",
+    "INC_RNK2",
+    "INC_RNK3",
+    "INC_RNK4",
+    "INC_RNK5",
+    "INC_RNKM"
+]
+
+MEMD_JOIN_KEYS = [
+    "NEWID"
+]
+
+MEMD_CATEGORICAL = [
+    "MARITAL",
+    "SEX",
+    "EMPLTYPE",
+    "HISPANIC",
+    "OCCULIST",
+    "WHYNOWRK",
+    "EDUCA",
+    "MEDICARE",
+    "PAYPERD",
+    "RC_WHITE",
+    "RC_BLACK",
+    "RC_ASIAN",
+    "RC_OTHER",
+    "WKSTATUS"
+]
+
+MEMD_NUMERICAL = [
+    "AGE",
+    "WAGEX",
+]
+
+MEMD_TIME_STAMPS = [
+    "TIME_STAMP"
+]
+
+EXPD_CATEGORICAL = [
+    "UCC",
+    "UCC1",
+    "UCC2",
+    "UCC3",
+    "UCC4",
+    "UCC5"
+]
+
+EXPD_JOIN_KEYS = [
+    "NEWID"
+]
+
+EXPD_NUMERICAL = [
+    "COST",
+    "EXPNYR",
+    "EXPNMO"
+]
+
+EXPD_TARGETS = [
+    "TARGET"
+]
+
+EXPD_TIME_STAMPS = [
+    "TIME_STAMP"
+]
+
+## -------------------------------------------------------------------
+## Dialects
+##
+## The preprocessing below is written with identifiers in double quotes.
+## Every dialect translates it into its own quoting and provides the
+## expressions and loading that differ between the databases.
+
+
+class Dialect:
+
+    name = None
+
+    quote = '"'
+
+    # The raw tables that are always loaded through the engine's data
+    # frames, no matter what PROJECTED_LOAD says.
+    projected = ()
+
+    def sql(self, query):
+        return re.sub(r'"(\w+)"', self.quote + r"\1" + self.quote, query)
+
+    def concat(self, *args):
+        return " || ".join(args)
+
+    def cast_int(self, expr):
+        return "CAST(" + expr + " AS INT)"
+
+    def transaction(self, query):
+        return query
+
+    def close(self):
+        pass
+
+    def bulk_load(self, table, fnames, columns):
+        database.read_csv(table, fnames)
+
+    def from_db(self, table_name, name, roles):
+        return data.DataFrame.from_db(table_name=table_name, name=name, roles=roles, ignore=True)
+
+
+class SQLite(Dialect):
+
+    # If fast_load is set, the preprocessing runs in a single transaction
+    # with journaling and syncing turned off. If anything goes wrong in the
+    # meantime, the database might be corrupted - just run the staging
+    # again. With more than one worker, the raw files are parsed in parallel
+    # and inserted in a single transaction of their own, with the same
+    # settings. The raw files loaded by the engine are not covered, see
+    # transaction.
+
+    name = "sqlite"
+
+    def __init__(
+            self,
+            fname=os.getenv("HOME") + "/consumer_expenditure.db",
+            num_workers=NUM_WORKERS,
+            fast_load=True):
+        self.fname = fname
+        self.num_workers = num_workers
+        self.fast_load = fast_load
+
+    def connect(self):
+        database.connect_sqlite3(name=self.fname, time_formats=['%Y/%m/%d'])
+
+    def bulk_load(self, table, fnames, columns):
+
+        if self.num_workers <= 1:
+            return Dialect.bulk_load(self, table, fnames, columns)
+
+        query = 'INSERT INTO "' + table + '" VALUES (' + ", ".join("?" * len(columns)) + ");"
+
+        connection = sqlite3.connect(self.fname)
+
+        try:
+            if self.fast_load:
+                connection.execute("PRAGMA journal_mode = OFF;")
+                connection.execute("PRAGMA synchronous = OFF;")
+
+            with connection:
+                parallel_csv.read_csv(
+                    fnames, columns, lambda rows: connection.executemany(query, rows), self.num_workers)
+
+        finally:
+            connection.close()
+
+    def transaction(self, query):
+
+        # The settings and BEGIN and COMMIT are sent along with the
+        # statements, because they only apply to the connection they are
+        # executed on, and the engine might not keep using the same
+        # connection between calls to database.execute. journal_mode cannot
+        # be changed inside a transaction, so the settings are changed before
+        # BEGIN and restored after COMMIT.
+        #
+        # For the same reason, nothing we send can reach the connection the
+        # engine uses for database.read_csv and DataFrame.to_db, so the raw
+        # files the engine loads are loaded with the durable settings.
+
+        if not self.fast_load:
+            return query
+
+        return (
+            "PRAGMA journal_mode = OFF;\n" +
+            "PRAGMA synchronous = OFF;\n" +
+            "BEGIN TRANSACTION;\n" +
+            query +
+            "\nCOMMIT;\n" +
+            "PRAGMA journal_mode = DELETE;\n" +
+            "PRAGMA synchronous = FULL;\n"
+        )
+
+
+class Postgres(Dialect):
+
+    # If copy_load is set, the raw files are loaded and the staged tables are
+    # extracted using COPY, which requires psycopg2 (see postgres_copy.py).
+    # The staged tables go through a temporary CSV file on this machine, so
+    # the engine must share its file system.
+
+    name = "postgres"
+
+    def __init__(
+            self,
+            hostaddr="127.0.0.1",
+            host="localhost",
+            port=5432,
+            dbname="mydb",
+            user="myuser",
+            password="mypassword",
+            copy_load=False):
+        self.settings = dict(
+            hostaddr=hostaddr, host=host, port=port, dbname=dbname, user=user, password=password)
+        self.copy_load = copy_load
+
+    def connect(self):
+        database.connect_postgres(time_formats=['%Y/%m/%d'], **self.settings)
+
+        if self.copy_load:
+            self.connection = postgres_copy.connect(**self.settings)
+
+    def bulk_load(self, table, fnames, columns):
+
+        if not self.copy_load:
+            return Dialect.bulk_load(self, table, fnames, columns)
+
+        postgres_copy.copy_from(self.connection, table, fnames)
+
+    def from_db(self, table_name, name, roles):
+
+        if not self.copy_load:
+            return Dialect.from_db(self, table_name, name, roles)
+
+        return postgres_copy.from_db(self.connection, table_name, name, roles)
+
+    def close(self):
+
+        if self.copy_load:
+            self.connection.close()
+
+
+class MySQL(Dialect):
+
+    # FMLD's original row size is too large for MySQL. If load_data is set,
+    # the raw files are loaded with LOAD DATA LOCAL INFILE, which requires
+    # local_infile to be enabled on the server (SET GLOBAL local_infile = 1)
+    # as well as on the engine's client connection. MySQL 8 disables it by
+    # default, which is why it is off here, too.
+
+    name = "mysql"
+
+    quote = "`"
+
+    projected = ("FMLD_RAW",)
+
+    def __init__(
+            self,
+            host="localhost",
+            port=3306,
+            dbname="mydb",
+            user="myuser",
+            password="mypassword",
+            load_data=False):
+        self.settings = dict(host=host, port=port, dbname=dbname, user=user, password=password)
+        self.load_data = load_data
+
+    def connect(self):
+        database.connect_mysql(time_formats=['%Y/%m/%d'], **self.settings)
+
+    def concat(self, *args):
+        return "CONCAT(" + ", ".join(args) + ")"
+
+    def cast_int(self, expr):
+        return "CAST(" + expr + " AS UNSIGNED)"
+
+    def bulk_load(self, table, fnames, columns):
+
+        if not self.load_data:
+            return Dialect.bulk_load(self, table, fnames, columns)
+
+        # Empty fields are loaded as NULL, like database.read_csv does, and
+        # the line endings of the original files are stripped from the last
+        # column.
+
+        variables = ["@v" + str(i) for i in range(len(columns))]
+
+        assignments = [
+            "`" + column + "` = NULLIF(" + variable + ", '')"
+            for (column, _), variable in zip(columns, variables)
+        ]
+
+        assignments[-1] = assignments[-1].replace(
+            variables[-1], "TRIM(TRAILING '\\r' FROM " + variables[-1] + ")")
+
+        for fname in fnames:
+            database.execute(
+                "LOAD DATA LOCAL INFILE '" + fname + "' INTO TABLE `" + table + "`\n" +
+                "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"'\n" +
+                "LINES TERMINATED BY '\\n'\n" +
+                "IGNORE 1 LINES\n" +
+                "(" + ", ".join(variables) + ")\n" +
+                "SET " + ",\n    ".join(assignments) + ";"
+            )
+
+
+DIALECTS = {
+    "sqlite": SQLite,
+    "postgres": Postgres,
+    "mysql": MySQL
+}
+
+## -------------------------------------------------------------------
+## Load data.
+
+
+def load_raw(dialect, name, fnames, roles, types, projected_load):
+
+    # Loads the raw files into the table name. Projected loads only keep the
+    # columns in roles.
+
+    if projected_load or name in dialect.projected:
+        df_raw = data.DataFrame.from_csv(
+            fnames=fnames,
+            name=name,
+            roles=roles,
+            ignore=True
+        )
+
+        database.execute(dialect.sql('DROP TABLE IF EXISTS "' + name + '";'))
+
+        df_raw.to_db(name)
+
+        # The data frame is only needed to write the table and would
+        # otherwise stay in the engine's memory until the staging is done.
+        df_raw.delete()
+
+    else:
+        columns = schema_cache.create_table(name, fnames, dialect.name, types)
+
+        dialect.bulk_load(name, fnames, columns)
+
+
+def raw_fnames(raw_data_folder):
+    return dict(
+        (table, [raw_data_folder + table.lower() + "15" + str(quarter) + ".csv" for quarter in range(1, 5)])
+        for table in ["EXPD", "FMLD", "MEMD"]
+    )
+
+
+def load(dialect, raw_data_folder, projected_load):
+
+    fnames = raw_fnames(raw_data_folder)
+
+    columns = schema_cache.create_table("EXPD_RAW", fnames["EXPD"], dialect.name, EXPD_TYPES)
+
+    dialect.bulk_load("EXPD_RAW", fnames["EXPD"], columns)
+
+    load_raw(dialect, "FMLD_RAW", fnames["FMLD"], {
+        "join_key": FMLD_JOIN_KEYS,
+        "numerical": FMLD_NUMERICAL
+    }, FMLD_TYPES, projected_load)
+
+    load_raw(dialect, "MEMD_RAW", fnames["MEMD"], {
+        "join_key": MEMD_JOIN_KEYS,
+        "categorical": MEMD_CATEGORICAL,
+        "numerical": MEMD_NUMERICAL
+    }, MEMD_TYPES, projected_load)
+
+## -------------------------------------------------------------------
+## Preprocessing
+
+
+def select(columns):
+    return ",\n           ".join('"' + column + '"' for column in columns)
+
+
+def preprocess(dialect):
+
+    # The statements are executed in a single call, see
+    # SQLite.transaction.
+
+    queries = []
+
+    # -----------------------------------------------------------------
+    # Preprocess EXPD.
+
+    queries.append("""
+    DROP TABLE IF EXISTS "EXPD";
+
+    CREATE TABLE "EXPD" AS
+    SELECT CASE WHEN "GIFT"=2 THEN 0 ELSE 1 END AS "TARGET",
+           """ + dialect.concat('"EXPNYR"', "'/'", '"EXPNMO"', "'/'", "'01'") + """ AS "TIME_STAMP",
+           "NEWID",
+           "EXPNYR",
+           """ + dialect.cast_int('"EXPNMO"') + """ AS "EXPNMO",
+           "COST",
+           substr("UCC", 1, 1) AS "UCC1",
+           substr("UCC", 1, 2) AS "UCC2",
+           substr("UCC", 1, 3) AS "UCC3",
+           substr("UCC", 1, 4) AS "UCC4",
+           substr("UCC", 1, 5) AS "UCC5",
+           substr("UCC", 1, 6) AS "UCC"
+    FROM "EXPD_RAW"
+    WHERE "EXPNMO" != '';
+    """)
+
+    # -----------------------------------------------------------------
+    # Preprocess MEMD.
+
+    queries.append("""
+    DROP TABLE IF EXISTS "MEMD";
+
+    CREATE TABLE "MEMD" AS
+    SELECT """ + select(MEMD_CATEGORICAL + MEMD_NUMERICAL + MEMD_JOIN_KEYS) + """,
+           '""" + MEMD_DATE + """' AS "TIME_STAMP"
+    FROM "MEMD_RAW";
+    """)
+
+    database.execute(dialect.transaction(dialect.sql("".join(queries))))
+
+## -------------------------------------------------------------------
+## Load the tables into the engine.
+
+
+def set_units(df):
+    for unit in ["UCC1", "UCC2", "UCC3", "UCC4", "UCC5", "UCC"]:
+        df.set_unit(unit, unit)
+    df.set_unit("EXPNMO", "month")
+
+
+def save_population(df_expd, df_fmld):
+
+    # The population tables are EXPD plus the income ranks from FMLD. NEWID
+    # is unique in FMLD, so we LEFT JOIN it onto EXPD, like the SQL path
+    # does. Rather than joining all of EXPD into POPULATION_ALL and
+    # splitting that, EXPD is split first and every split is joined on its
+    # own. That way, the engine holds EXPD and one more copy of it rather
+    # than three.
+    #
+    # The partitions are assigned in FMLD, which has one row per NEWID, see
+    # population_split.py. Only the PARTITION column is joined onto EXPD,
+    # replacing it in the engine, and removed again once EXPD is split. EXPD
+    # has already been saved without it.
+
+    population_split.add_partitions(df_fmld)
+
+    df_expd = df_expd.join(
+        name=df_expd.name,
+        other=df_fmld,
+        join_key="NEWID",
+        other_cols=[df_fmld[population_split.PARTITION]],
+        how="left"
+    )
+
+    df_splits = population_split.split(df_expd)
+
+    df_expd.rm(population_split.PARTITION)
+
+    for df_split in df_splits:
+        df_population = df_split.join(
+            name=df_split.name,
+            other=df_fmld,
+            join_key="NEWID",
+            other_cols=[df_fmld[column] for column in FMLD_NUMERICAL],
+            how="left"
+        )
+
+        set_units(df_population)
+
+        df_population.save()
+
+
+def load_into_engine(dialect):
+
+    # -----------------------------------------------------------------
+    # Load EXPD into the engine.
+
+    df_expd = dialect.from_db("EXPD", "EXPD", {
+        "join_key": EXPD_JOIN_KEYS,
+        "time_stamp": EXPD_TIME_STAMPS,
+        "categorical": EXPD_CATEGORICAL,
+        "numerical": EXPD_NUMERICAL,
+        "target": EXPD_TARGETS
+    })
+
+    set_units(df_expd)
+
+    df_expd.save()
+
+    # -----------------------------------------------------------------
+    # Make the population tables. Only the columns of FMLD_RAW we need
+    # are loaded into the engine.
+
+    df_fmld = dialect.from_db("FMLD_RAW", "FMLD", {
+        "join_key": FMLD_JOIN_KEYS,
+        "numerical": FMLD_NUMERICAL
+    })
+
+    save_population(df_expd, df_fmld)
+
+    # -----------------------------------------------------------------
+    # Load MEMD into the engine.
+
+    df_memd = dialect.from_db("MEMD", "MEMD", {
+        "join_key": MEMD_JOIN_KEYS,
+        "time_stamp": MEMD_TIME_STAMPS,
+        "categorical": MEMD_CATEGORICAL,
+        "numerical": MEMD_NUMERICAL
+    })
+
+    df_memd.save()
+
+## -------------------------------------------------------------------
+
+
+def stage(dialect, raw_data_folder=RAW_DATA_FOLDER, projected_load=PROJECTED_LOAD):
+
+    dialect.connect()
+
+    try:
+        engine.set_project("CE")
+
+        load(dialect, raw_data_folder, projected_load)
+
+        preprocess(dialect)
+
+        load_into_engine(dialect)
+
+    finally:
+        dialect.close()
+
+## -------------------------------------------------------------------
+## Preprocessing in the engine
+##
+## The same preprocessing using the engine's column operators. The raw
+## files are read into the engine once and no database is involved, so
+## nothing is copied from one to the other.
+
+
+def stage_in_engine(raw_data_folder=RAW_DATA_FOLDER):
+
+    engine.set_project("CE")
+
+    fnames = raw_fnames(raw_data_folder)
+
+    # -----------------------------------------------------------------
+    # Preprocess EXPD.
+
+    df_expd_raw = data.DataFrame.from_csv(
+        fnames=fnames["EXPD"],
+        name="EXPD_RAW",
+        roles={
+            "join_key": EXPD_JOIN_KEYS,
+            "categorical": ["UCC"],
+            "numerical": EXPD_NUMERICAL,
+            "unused_float": ["GIFT"]
+        },
+        ignore=True
+    )
+
+    expnyr = df_expd_raw["EXPNYR"]
+    expnmo = df_expd_raw["EXPNMO"]
+
+    df_expd = df_expd_raw.where("EXPD", (expnyr.is_nan() | expnmo.is_nan()).is_false())
+
+    # EXPD_RAW is not needed any longer and would otherwise stay in the
+    # engine's memory next to EXPD.
+    df_expd_raw.delete()
+
+    expnyr = df_expd["EXPNYR"]
+    expnmo = df_expd["EXPNMO"]
+
+    df_expd.add((df_expd["GIFT"] == 2).is_false(), "TARGET", roles.target)
+
+    df_expd.add(
+        (expnyr.as_str() + "/" + expnmo.as_str()).as_ts(["%Y/%n"]), "TIME_STAMP", roles.time_stamp)
+
+    ucc = df_expd["UCC"]
+
+    for i in range(1, 6):
+        df_expd.add(ucc.substr(0, i), "UCC" + str(i), roles.categorical)
+
+    df_expd.rm("GIFT")
+
+    set_units(df_expd)
+
+    df_expd.save()
+
+    # -----------------------------------------------------------------
+    # Make the population tables.
+
+    df_fmld = data.DataFrame.from_csv(
+        fnames=fnames["FMLD"],
+        name="FMLD",
+        roles={
+            "join_key": FMLD_JOIN_KEYS,
+            "numerical": FMLD_NUMERICAL
+        },
+        ignore=True
+    )
+
+    save_population(df_expd, df_fmld)
+
+    # -----------------------------------------------------------------
+    # Preprocess MEMD.
+
+    df_memd = data.DataFrame.from_csv(
+        fnames=fnames["MEMD"],
+        name="MEMD",
+        roles={
+            "join_key": MEMD_JOIN_KEYS,
+            "categorical": MEMD_CATEGORICAL,
+            "numerical": MEMD_NUMERICAL
+        },
+        ignore=True
+    )
+
+    # All rows share the same time stamp, so we parse it once rather than
+    # once per row.
+    memd_time_stamp = calendar.timegm(time.strptime(MEMD_DATE, "%Y/%m/%d"))
+
+    df_memd.add(df_memd.numerical_column(memd_time_stamp), "TIME_STAMP", roles.time_stamp)
+
+    df_memd.save()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stage the CE data in a database.")
+
+    parser.add_argument("--dialect", choices=sorted(DIALECTS), default="sqlite")
+    parser.add_argument("--in-engine", action="store_true", help="Preprocess in the engine, without a database.")
+    parser.add_argument("--raw-folder", default=RAW_DATA_FOLDER, help="The folder that contains expd151.csv.")
+    parser.add_argument("--full-load", action="store_true", help="Load all columns of FMLD and MEMD.")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="Parse the raw files in parallel (sqlite).")
+    parser.add_argument(
+        "--copy-load",
+        action="store_true",
+        help="Use COPY with postgres (requires psycopg2 and an engine on the same file system).")
+    parser.add_argument(
+        "--load-data", action="store_true", help="Use LOAD DATA LOCAL INFILE with mysql (requires local_infile).")
+
+    args = parser.parse_args()
+
+    begin = time.time()
+
+    raw_data_folder = os.path.join(args.raw_folder, "")
+
+    if args.in_engine:
+        stage_in_engine(raw_data_folder)
+    elif args.dialect == "sqlite":
+        stage(SQLite(num_workers=args.workers), raw_data_folder, not args.full_load)
+    elif args.dialect == "postgres":
+        stage(Postgres(copy_load=args.copy_load), raw_data_folder, not args.full_load)
+    else:
+        stage(MySQL(load_data=args.load_data), raw_data_folder, not args.full_load)
+
+    print("Time taken: " + str(time.time() - begin) + " seconds.")
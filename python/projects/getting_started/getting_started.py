@@ -74,9 +74,28 @@ engine.set_project("gettingStarted")
 # Location inside this repository the data is kept.
 source_path = os.path.join(os.getcwd(), "../../../data/consumer_expenditures/")
 
-CE_population_training = pd.read_csv(os.path.join(source_path, "CE_population_training.csv"))
-CE_population_validation = pd.read_csv(os.path.join(source_path, "CE_population_validation.csv"))
-CE_peripheral = pd.read_csv(os.path.join(source_path, "CE_peripheral.csv"))
+# If the conversion script was run with OUTPUT_FORMAT = "parquet", we
+# can skip parsing the .csv files and get the column types for free.
+def read_table(name):
+    fname = os.path.join(source_path, name)
+    if os.path.exists(fname + ".parquet"):
+        return pd.read_parquet(fname + ".parquet")
+    return pd.read_csv(fname + ".csv")
+
+CE_peripheral = read_table("CE_peripheral")
+
+# The population tables are the training and validation rows of the
+# peripheral table. If the conversion script was run with
+# WRITE_POPULATION_FILES = False, we select them from the peripheral
+# table we already have in memory instead of reading them from disk.
+def read_population(name, stage):
+    fname = os.path.join(source_path, name)
+    if os.path.exists(fname + ".parquet") or os.path.exists(fname + ".csv"):
+        return read_table(name)
+    return CE_peripheral[CE_peripheral["Stage"] == stage]
+
+CE_population_training = read_population("CE_population_training", "Training")
+CE_population_validation = read_population("CE_population_validation", "Validation")
 
 
 # In order for the automated feature engineering to get the most out of
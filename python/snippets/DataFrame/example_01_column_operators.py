@@ -94,6 +94,12 @@ my_df.set_role("join_key", roles.join_key)
 col1 = my_df["column_01"]
 
 # ----------------
+# Operators on columns do not compute anything right
+# away - col2 only describes the new column. The
+# engine computes it when it is added to a data frame
+# or fetched. Longer expressions like col3 or col9
+# below are sent to the engine as a whole, so there is
+# no need to add their parts to a data frame first.
 
 col2 = 2.0 - col1
 
@@ -138,6 +144,13 @@ col7 = (col1 * 100000.0).sqrt()
 
 my_df.add(col7, name="column_07", role=roles.numerical, unit="time stamp, comparison only")
 
+# col7 is the source of the date parts below. Once it
+# has been added, we derive them from the stored
+# column, so the square root is only computed once
+# rather than once for every date part.
+
+col7 = my_df["column_07"]
+
 # ----------------
 
 col8 = col1 % 0.5
@@ -159,52 +172,36 @@ col10 = col1.ceil()
 my_df.add(col10, "column_10", roles.time_stamp)
 
 # ----------------
+# When you derive many columns at once, it is convenient
+# to describe them as a dict mapping their names to
+# (column, role, unit). add_columns is just a loop for
+# convenience - every column is still added by its own
+# call to DataFrame.add, so N columns still cost N
+# commands to the engine.
 
-col11 = col7.year()
-
-my_df.add(col11, "year", roles.numerical, unit="year, comparison only")
 
-# ----------------
-
-col12 = col7.month()
+def add_columns(df, columns):
+    for name, (col, role, unit) in columns.items():
+        df.add(col, name, role, unit=unit)
 
-my_df.add(col12, "month", roles.numerical)
 
 # ----------------
+# date_parts returns any subset of the calendar fields
+# of a time stamp column as separate columns.
 
-col13 = col7.day()
-
-my_df.add(col13, "day", roles.numerical)
+DATE_PARTS = ["year", "month", "day", "hour", "minute", "second", "weekday", "yearday"]
 
-# ----------------
-
-col14 = col7.hour()
-
-my_df.add(col14, "hour", roles.numerical)
-
-# ----------------
 
-col15 = col7.minute()
+def date_parts(col, fields=DATE_PARTS):
+    return dict((field, getattr(col, field)()) for field in fields)
 
-my_df.add(col15, "minute", roles.numerical)
-
-# ----------------
-
-col16 = col7.second()
-
-my_df.add(col16, "second", roles.numerical)
-
-# ----------------
-
-col17 = col7.weekday()
-
-my_df.add(col17, "weekday", roles.numerical)
-
-# ----------------
 
-col18 = col7.yearday()
+units = {"year": "year, comparison only"}
 
-my_df.add(col18, "yearday", roles.numerical)
+add_columns(my_df, dict(
+    (name, (part, roles.numerical, units.get(name, "")))
+    for name, part in date_parts(col7).items()
+))
 
 # ----------------
 
@@ -227,14 +224,20 @@ my_df.add(col21, "new_names")
 
 # ----------------
 
-col22 = col17.as_str()
+col22 = my_df["weekday"].as_str()
 
 my_df.add(col22, "weekday", roles.categorical)
 
 # ----------------
+# as_ts tries the time_formats in the order in which they
+# are listed, so put the format most of your values are
+# in first. If a column contains only a handful of
+# distinct values (like a constant date), it is cheaper
+# to parse them once in Python and add the result as a
+# numerical column with roles.time_stamp.
 
 col23 = my_df["time_stamp"].as_ts(
-    time_formats=["%Y-%m-%dT%H:%M:%s%z", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"]
+    time_formats=["%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%s%z"]
 )
 
 my_df.add(col23, "ts", roles.time_stamp)
@@ -0,0 +1,149 @@
+# Copyright 2019 The SQLNet Company GmbH
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import queue
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import getml.data as data
+import getml.engine as engine
+
+# ----------------
+
+engine.set_project("examples")
+
+# ----------------
+# Like in MultirelModel/example_02_low_level.py, a data frame can be
+# uploaded piece by piece using read_pandas(..., append=True). This
+# function does that for any iterator of pandas.DataFrames, so the table
+# never needs to fit into memory as a whole.
+#
+# While one chunk is sent to the engine, the next ones are produced in a
+# background thread. No more than max_in_flight chunks are waiting at any
+# time - if the engine falls behind, the producer waits.
+
+
+def read_pandas_chunks(df, chunks, max_in_flight=2):
+
+    pending = queue.Queue(maxsize=max_in_flight)
+
+    # Set once the upload is over, successful or not. The producer then
+    # stops waiting for room in the queue, so it never blocks forever
+    # after read_pandas has failed.
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for chunk in chunks:
+                if not put(chunk):
+                    return
+            put(None)
+        except Exception as ex:
+            put(ex)
+        finally:
+            # Generators and file readers are closed in the thread that
+            # iterates over them.
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    begin = time.time()
+
+    num_rows = 0
+
+    first = True
+
+    try:
+        while True:
+            chunk = pending.get()
+
+            if chunk is None:
+                break
+
+            if isinstance(chunk, Exception):
+                raise chunk
+
+            df.read_pandas(chunk, append=not first)
+
+            first = False
+
+            num_rows += len(chunk)
+
+            print(
+                "Uploaded " + str(num_rows) + " rows, " +
+                str(int(num_rows / (time.time() - begin))) + " rows per second.")
+
+    finally:
+        stop.set()
+        producer.join()
+
+    return df
+
+# ----------------
+# The chunks are generated on the fly here, but they could just as well
+# come from pandas.read_csv(..., chunksize=...) or a database cursor.
+
+
+def make_peripheral(n_rows, chunk_size, random):
+    for begin in range(0, n_rows, chunk_size):
+        size = min(chunk_size, n_rows - begin)
+
+        chunk = pd.DataFrame()
+        chunk["column_01"] = random.rand(size) * 2.0 - 1.0
+        chunk["join_key"] = random.randint(0, 500, size)
+        chunk["time_stamp"] = random.rand(size)
+
+        yield chunk
+
+# ----------------
+
+random = np.random.RandomState(8290)
+
+peripheral_on_engine = read_pandas_chunks(
+    data.DataFrame(
+        name="PERIPHERAL",
+        roles={
+            "join_key": ["join_key"],
+            "numerical": ["column_01"],
+            "time_stamp": ["time_stamp"]}
+    ),
+    make_peripheral(n_rows=1000000, chunk_size=100000, random=random)
+)
+
+print(peripheral_on_engine)
+
+# ----------------
+
+engine.delete_project("examples")
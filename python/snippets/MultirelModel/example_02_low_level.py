@@ -107,6 +107,8 @@ population_table.targets = np.where(
 
 # The low-level API allows you to upload
 # data to the getML engine in a piecewise fashion.
+# (DataFrame/example_03_chunked_upload.py does
+# this for tables that do not fit into memory.)
 # Here we load the first part of the pandas.DataFrame...
 peripheral_on_engine = data.DataFrame(
     name="PERIPHERAL",